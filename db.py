@@ -1,98 +1,205 @@
 import sqlite3
 import os
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Iterable, Optional, Tuple
 
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'app.db')
 
-
-def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+# Writes are serialized through this lock so the single shared connection
+# stays safe under WAL's one-writer-at-a-time rule.
+_WRITE_LOCK = threading.Lock()
+
+
+# Constant SQL strings shared across calls so the connection's statement
+# cache hits instead of re-parsing and re-planning each query. Columns are
+# listed explicitly to keep the planner and result indexes stable.
+_USER_COLUMNS = (
+    "id, username, password_hash, plan, preferences_json, is_premium, created_at, "
+    "api_key, api_key_last_generated_at, daily_api_key_count"
+)
+_SQL_FIND_BY_USERNAME = f"SELECT {_USER_COLUMNS} FROM users WHERE username = ?"
+_SQL_FIND_BY_ID = f"SELECT {_USER_COLUMNS} FROM users WHERE id = ?"
+_SQL_FIND_PLAN = "SELECT plan FROM users WHERE id = ?"
+_SQL_INSERT_USER = "INSERT INTO users (username, password_hash, plan, is_premium) VALUES (?, ?, ?, ?) RETURNING id"
+_SQL_UPDATE_PREFERENCES = "UPDATE users SET preferences_json = ? WHERE id = ?"
+# Atomically checks the daily quota and bumps the counter in one statement,
+# so two concurrent requests cannot both slip under the limit.
+_SQL_BUMP_API_KEY = (
+    "UPDATE users SET api_key = ?, "
+    "daily_api_key_count = CASE WHEN api_key_last_generated_at = ? THEN daily_api_key_count + 1 ELSE 1 END, "
+    "api_key_last_generated_at = ? "
+    "WHERE id = ? AND (api_key_last_generated_at IS NOT ? OR daily_api_key_count < ?) "
+    "RETURNING daily_api_key_count, plan"
+)
+
+API_KEY_DAILY_LIMIT = 2
+
+
+def _connect() -> sqlite3.Connection:
+    # Shared-cache URI so any additional connections (e.g. a future reader
+    # pool) reuse the same page cache instead of duplicating hot B-tree
+    # pages per connection.
+    conn = sqlite3.connect(
+        f"file:{DB_PATH}?mode=rwc&cache=shared",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=256,
+    )
     conn.row_factory = sqlite3.Row
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-64000;
+        PRAGMA mmap_size=268435456;
+        PRAGMA busy_timeout=5000;
+        """
+    )
     return conn
 
 
+# Single process-wide connection; opening/closing per request throws away
+# SQLite's page cache on every call.
+_CONN = _connect()
+
+
+def get_connection() -> sqlite3.Connection:
+    return _CONN
+
+
+_DDL_CREATE_USERS = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    plan TEXT NOT NULL DEFAULT 'free',
+    preferences_json TEXT,
+    is_premium INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    api_key TEXT,
+    api_key_last_generated_at TEXT,
+    daily_api_key_count INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# Migrations for existing DBs, keyed by the column each one adds
+_MIGRATIONS = {
+    "plan": "ALTER TABLE users ADD COLUMN plan TEXT NOT NULL DEFAULT 'free'",
+    "preferences_json": "ALTER TABLE users ADD COLUMN preferences_json TEXT",
+    "api_key": "ALTER TABLE users ADD COLUMN api_key TEXT",
+    "api_key_last_generated_at": "ALTER TABLE users ADD COLUMN api_key_last_generated_at TEXT",
+    "daily_api_key_count": "ALTER TABLE users ADD COLUMN daily_api_key_count INTEGER NOT NULL DEFAULT 0",
+}
+
+
 def init_db() -> None:
     conn = get_connection()
-    try:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                plan TEXT NOT NULL DEFAULT 'free',
-                preferences_json TEXT,
-                is_premium INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        # Migrations for existing DBs
-        try:
-            conn.execute("ALTER TABLE users ADD COLUMN plan TEXT NOT NULL DEFAULT 'free'")
-        except: pass
-        try:
-            conn.execute("ALTER TABLE users ADD COLUMN preferences_json TEXT")
-        except: pass
-        
-        conn.commit()
-    finally:
-        conn.close()
-
-
-def create_user(username: str, password_hash: str, plan: str = 'free', is_premium: bool = False) -> Tuple[bool, Optional[str]]:
+    with _WRITE_LOCK:
+        # Existing columns; empty when the table has not been created yet,
+        # in which case the CREATE TABLE carries the full schema and no
+        # ALTERs are needed.
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(users)")}
+        statements = [_DDL_CREATE_USERS]
+        if existing:
+            statements.extend(
+                ddl for column, ddl in _MIGRATIONS.items() if column not in existing
+            )
+        # One script inside one explicit transaction: a single WAL sync on
+        # startup instead of one per schema statement.
+        conn.executescript("BEGIN IMMEDIATE;\n" + ";\n".join(statements) + ";\nCOMMIT;")
+
+
+def create_user(username: str, password_hash: str, plan: str = 'free', is_premium: bool = False) -> Tuple[bool, Optional[int], Optional[str]]:
     try:
         conn = get_connection()
-        with conn:
-            conn.execute(
-                "INSERT INTO users (username, password_hash, plan, is_premium) VALUES (?, ?, ?, ?)",
-                (username, password_hash, plan, 1 if is_premium else 0),
-            )
-        return True, None
+        with _WRITE_LOCK, conn:
+            cur = conn.execute(_SQL_INSERT_USER, (username, password_hash, plan, 1 if is_premium else 0))
+            user_id = cur.fetchone()[0]
+        return True, user_id, None
     except sqlite3.IntegrityError as e:
-        return False, "username already exists"
+        return False, None, "username already exists"
     except Exception as e:
-        return False, str(e)
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        return False, None, str(e)
+
+
+def create_users_bulk(rows: Iterable[Tuple[str, str, str, bool]]) -> int:
+    """Insert many (username, password_hash, plan, is_premium) rows at once.
+
+    Runs a single executemany inside one transaction, so the WAL is synced
+    once for the whole batch instead of once per row. Callers provisioning
+    many accounts should prefer this over looping create_user.
+    """
+    conn = get_connection()
+    with _WRITE_LOCK, conn:
+        cur = conn.executemany(
+            "INSERT INTO users (username, password_hash, plan, is_premium) VALUES (?, ?, ?, ?)",
+            ((u, p, plan, 1 if premium else 0) for u, p, plan, premium in rows),
+        )
+        return cur.rowcount
 
 
 def find_user_by_username(username: str) -> Optional[sqlite3.Row]:
     conn = get_connection()
-    try:
-        cur = conn.execute("SELECT * FROM users WHERE username = ?", (username,))
-        row = cur.fetchone()
-        return row
-    finally:
-        conn.close()
+    cur = conn.execute(_SQL_FIND_BY_USERNAME, (username,))
+    return cur.fetchone()
 
 
 def find_user_by_id(user_id: int) -> Optional[sqlite3.Row]:
     conn = get_connection()
-    try:
-        cur = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        row = cur.fetchone()
-        return row
-    finally:
-        conn.close()
+    cur = conn.execute(_SQL_FIND_BY_ID, (user_id,))
+    return cur.fetchone()
+
+
+# Short-TTL plan cache: the plan only changes on billing events, yet the
+# plan check runs on nearly every authenticated request. Entries expire
+# after a minute so upgrades show up without explicit invalidation.
+_PLAN_CACHE = {}
+_PLAN_CACHE_TTL = 60.0
+_PLAN_CACHE_MAX = 1024
+
+
+def get_user_plan(user_id: int) -> Optional[str]:
+    now = time.time()
+    hit = _PLAN_CACHE.get(user_id)
+    if hit is not None and now - hit[0] < _PLAN_CACHE_TTL:
+        return hit[1]
+    conn = get_connection()
+    row = conn.execute(_SQL_FIND_PLAN, (user_id,)).fetchone()
+    plan = row["plan"] if row else None
+    if len(_PLAN_CACHE) >= _PLAN_CACHE_MAX:
+        # Drop expired entries first; if everything is still fresh, evict
+        # the oldest insertions (dicts preserve insertion order).
+        for uid in [u for u, (ts, _) in _PLAN_CACHE.items() if now - ts >= _PLAN_CACHE_TTL]:
+            del _PLAN_CACHE[uid]
+        while len(_PLAN_CACHE) >= _PLAN_CACHE_MAX:
+            del _PLAN_CACHE[next(iter(_PLAN_CACHE))]
+    _PLAN_CACHE[user_id] = (now, plan)
+    return plan
 
 
 def update_user_preferences(user_id: int, preferences_json: str) -> bool:
     conn = get_connection()
     try:
-        with conn:
-            conn.execute(
-                "UPDATE users SET preferences_json = ? WHERE id = ?",
-                (preferences_json, user_id)
-            )
+        with _WRITE_LOCK, conn:
+            conn.execute(_SQL_UPDATE_PREFERENCES, (preferences_json, user_id))
         return True
     except Exception:
         return False
-    finally:
-        conn.close()
 
 
+def bump_api_key(user_id: int, new_key: str, today: str) -> Optional[sqlite3.Row]:
+    """Store a new API key for the user, enforcing the daily quota.
+
+    Returns the (daily_api_key_count, plan) row, or None when the user has
+    already generated API_KEY_DAILY_LIMIT keys today.
+    """
+    conn = get_connection()
+    with _WRITE_LOCK, conn:
+        cur = conn.execute(
+            _SQL_BUMP_API_KEY,
+            (new_key, today, today, user_id, today, API_KEY_DAILY_LIMIT),
+        )
+        return cur.fetchone()
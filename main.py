@@ -1,17 +1,93 @@
 from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from flask.json.provider import JSONProvider
 from temp_mail_generator import TempMailGenerator
 import os
 import hashlib
-from db import init_db, create_user, find_user_by_username, find_user_by_id
+import hmac
+import json
+import re
+import secrets
+import uuid
+from datetime import date
+from db import (
+    init_db,
+    create_user,
+    find_user_by_username,
+    find_user_by_id,
+    get_user_plan,
+    update_user_preferences,
+    bump_api_key,
+)
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson.
+
+    dumps returns str because Flask's session serializer expects text;
+    response() skips that decode and hands orjson's bytes straight to the
+    response object.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        if not args and not kwargs:
+            obj = None
+        elif len(args) == 1:
+            obj = args[0]
+        else:
+            obj = args or kwargs
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+
+if orjson is not None:
+    def _dump_preferences(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    _dump_preferences = json.dumps
 
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key")
+if orjson is not None:
+    app.json = ORJSONProvider(app)
+
+# Bound method reference kept at module scope so key generation skips the
+# per-call attribute lookup on the secrets module
+_new_api_key = secrets.token_urlsafe
 init_db()
 
 
-# Single generator instance keeps the selected email/login/domain in memory
-mail = TempMailGenerator()
+# Per-session generator instances, cached server-side and looked up by a
+# small sid stored in the cookie. Keeping the generator out of the session
+# avoids re-serializing mail state into the signed cookie on every poll.
+_MAIL_CACHE = {}
+_MAIL_CACHE_MAX = 1024
+
+
+def get_mail_instance() -> TempMailGenerator:
+    sid = session.get("sid")
+    if not sid:
+        sid = uuid.uuid4().hex
+        session["sid"] = sid
+    inst = _MAIL_CACHE.get(sid)
+    if inst is None:
+        if len(_MAIL_CACHE) >= _MAIL_CACHE_MAX:
+            _MAIL_CACHE.pop(next(iter(_MAIL_CACHE)))
+        inst = _MAIL_CACHE[sid] = TempMailGenerator()
+    return inst
 
 
 @app.route("/health", methods=["GET"]) 
@@ -29,14 +105,14 @@ def dashboard():
 
 @app.route("/domains", methods=["GET"]) 
 def domains():
-    return jsonify({"domains": mail.get_available_domains()})
+    return jsonify({"domains": get_mail_instance().get_available_domains()})
 
 
 @app.route("/generate/random", methods=["POST"]) 
 def generate_random():
     data = request.get_json(silent=True) or {}
     length = data.get("length", 10)
-    email = mail.generate_random_email(length=length)
+    email = get_mail_instance().generate_random_email(length=length)
     return jsonify({"email": email})
 
 
@@ -52,22 +128,27 @@ def generate_custom():
     if not uid:
         return jsonify({"error": "login required"}), 401
     
-    user = find_user_by_id(int(uid))
-    if not user or user["plan"] == "free":
+    plan = get_user_plan(int(uid))
+    if plan is None or plan == "free":
         return jsonify({"error": "₹99 Starter plan or higher required for custom identities"}), 403
-    email = mail.generate_custom_email(username=username, domain=domain)
+    email = get_mail_instance().generate_custom_email(username=username, domain=domain)
     return jsonify({"email": email})
 
 
 @app.route("/inbox", methods=["GET"]) 
 def get_inbox():
+    mail = get_mail_instance()
     inbox = mail.get_inbox()
-    return jsonify({"email": mail.email, "messages": inbox})
+    resp = jsonify({"email": mail.email, "messages": inbox})
+    # Dashboard polls this endpoint on a timer; answer unchanged inboxes
+    # with a 304 instead of re-sending the full message list.
+    resp.set_etag(hashlib.blake2b(resp.get_data(), digest_size=8).hexdigest())
+    return resp.make_conditional(request)
 
 
 @app.route("/read/<int:email_id>", methods=["GET"]) 
 def read_email(email_id: int):
-    data = mail.read_email(email_id)
+    data = get_mail_instance().read_email(email_id)
     if not data:
         return jsonify({"error": "email not found or no email selected"}), 404
     return jsonify(data)
@@ -78,7 +159,7 @@ def export_inbox():
     data = request.get_json(silent=True) or {}
     output_dir = data.get("output_dir", "inbox")
     os.makedirs(output_dir, exist_ok=True)
-    files = mail.export_inbox(output_dir)
+    files = get_mail_instance().export_inbox(output_dir)
     return jsonify({
         "saved": len(files),
         "files": files,
@@ -88,8 +169,35 @@ def export_inbox():
 
 # -------- Auth --------
 
+_PAID_PLANS = frozenset({'starter', 'pro', 'enterprise', 'api'})
+
+# Compiled once; re's internal cache is bounded and can evict under churn
+_USERNAME_RE = re.compile(r"^[a-z0-9_]{3,32}$")
+
+# PBKDF2 with a per-user salt; C-backed in hashlib and SHA-NI accelerated
+# on OpenSSL builds that support it. The salt travels inside the stored
+# string so no schema change is needed.
+_PBKDF2_ITERATIONS = 100_000
+
+
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, _PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${_PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if stored.startswith("pbkdf2_sha256$"):
+        try:
+            _, iterations, salt_hex, digest_hex = stored.split("$")
+            digest = hashlib.pbkdf2_hmac(
+                "sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), int(iterations)
+            )
+            return hmac.compare_digest(digest.hex(), digest_hex)
+        except (ValueError, TypeError):
+            return False
+    # Legacy unsalted SHA-256 hashes from before the PBKDF2 switch
+    return hmac.compare_digest(stored, hashlib.sha256(password.encode("utf-8")).hexdigest())
 
 
 @app.route("/login", methods=["GET"]) 
@@ -112,14 +220,16 @@ def signup():
     if not username or not password:
         return jsonify({"error": "username and password required"}), 400
     
+    if not _USERNAME_RE.match(username):
+        return jsonify({"error": "username must be 3-32 lowercase letters, digits or underscores"}), 400
+    
     # is_premium is true for any paid plan
-    is_premium = plan in ['starter', 'pro', 'enterprise', 'api']
+    is_premium = plan in _PAID_PLANS
     
-    ok, err = create_user(username, hash_password(password), plan=plan, is_premium=is_premium)
+    ok, user_id, err = create_user(username, hash_password(password), plan=plan, is_premium=is_premium)
     if not ok:
         return jsonify({"error": err or "failed to create user"}), 400
-    user = find_user_by_username(username)
-    session["user_id"] = int(user["id"]) if user else None
+    session["user_id"] = user_id
     return jsonify({"ok": True, "redirect": "/dashboard"})
 
 
@@ -129,7 +239,7 @@ def login():
     username = (data.get("username") or "").strip()
     password = (data.get("password") or "").strip()
     user = find_user_by_username(username)
-    if not user or user["password_hash"] != hash_password(password):
+    if not user or not verify_password(password, user["password_hash"]):
         return jsonify({"error": "invalid credentials"}), 401
     session["user_id"] = int(user["id"])
     return jsonify({"ok": True, "redirect": "/dashboard"})
@@ -161,22 +271,42 @@ def me():
     })
 
 
+@app.route("/apikey/create", methods=["POST"])
+def create_api_key():
+    uid = session.get("user_id")
+    if not uid:
+        return jsonify({"error": "login required"}), 401
+
+    plan = get_user_plan(int(uid))
+    if plan is None:
+        return jsonify({"error": "user not found"}), 404
+
+    if plan == "free":
+        return jsonify({"error": "₹99 Starter plan or higher required for API keys"}), 403
+
+    new_key = _new_api_key(32)
+    # Single quota-checking UPDATE; None means today's limit is exhausted
+    row = bump_api_key(int(uid), new_key, date.today().isoformat())
+    if row is None:
+        return jsonify({"error": "daily API key limit reached"}), 429
+    return jsonify({"ok": True, "api_key": new_key, "generated_today": row["daily_api_key_count"]})
+
+
 @app.route("/settings", methods=["POST"])
 def update_settings():
     uid = session.get("user_id")
     if not uid:
         return jsonify({"error": "login required"}), 401
     
-    user = find_user_by_id(int(uid))
-    if not user:
+    plan = get_user_plan(int(uid))
+    if plan is None:
         return jsonify({"error": "user not found"}), 404
     
-    if user["plan"] == "free":
+    if plan == "free":
         return jsonify({"error": "₹99 Starter plan or higher required to save settings"}), 403
     
     data = request.get_json(silent=True) or {}
-    import json
-    updated = update_user_preferences(int(uid), json.dumps(data))
+    updated = update_user_preferences(int(uid), _dump_preferences(data))
     
     if updated:
         return jsonify({"ok": True, "message": "Settings preserved securely"})
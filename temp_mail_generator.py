@@ -1,12 +1,84 @@
+import asyncio
+import itertools
+import logging
+import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
 import time
 import random
+import secrets
 import string
 import json
 import os
+import shutil
+import tempfile
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger("tempmail")
+
+# Progress output is only useful (and only rewritable via \r) on a TTY;
+# when piped, skip it entirely instead of spamming logs with dots
+_IS_TTY = sys.stdout.isatty()
+
+# Sentinel for conditional GETs answered with 304 Not Modified
+_NOT_MODIFIED = object()
+
+# Common User-Agents; one is picked per session and only rotated after a
+# 403, since keep-alive connections survive best under stable headers
+_USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/126.0",
+)
+
+# Filename sanitizer: one C-level translate pass plus whitespace collapse,
+# replacing the two regex substitutions previously run per saved email
+_SANITIZE_TABLE = str.maketrans({c: "_" for c in '\\/:*?"<>|'})
+
+# Local-part alphabet for generated addresses; secrets.choice draws from
+# the OS CSPRNG in one C call per character instead of MT19937 draws
+_ALPHABET = string.ascii_lowercase + string.digits
+
+# Messages larger than this are spooled to disk instead of being decoded
+# into memory; embedded base64 attachments can reach several MB
+MAX_INLINE_BODY = 1 << 20  # 1 MiB
+
+# Persisted mail.tm credentials survive process restarts, saving the
+# three round-trips (domains, account, token) on every CLI run
+_MAILTM_CREDS_PATH = os.path.expanduser("~/.cache/tempmail/mailtm.json")
+_MAILTM_TOKEN_TTL_SEC = 2 * 60 * 60  # mail.tm tokens last hours; assume ~2h
+
+# Hardcoded fallback when the 1secmail domain list cannot be fetched
+_FALLBACK_1SECMAIL_DOMAINS = ("1secmail.com", "1secmail.org", "1secmail.net")
+
+# Polling backoff bounds: double the delay while the inbox stays empty,
+# reset on new mail, and jitter ±20% so synchronized clients spread out.
+_POLL_DELAY_MIN = 2.0
+_POLL_DELAY_MAX = 60.0
+
+
+# All OTP/code patterns folded into one alternation, compiled once, so a
+# body is scanned in a single pass instead of once per pattern.
+_CODE_RE = re.compile(
+    r"""(?ix)
+    code[:\s]+(?P<code>[A-Z0-9]{4,8})
+    | otp[:\s]+(?P<otp>\d{4,8})
+    | verification\ code[:\s]+(?P<vc>[A-Z0-9]{4,8})
+    | pin[:\s]+(?P<pin>\d{4,6})
+    | \b(?P<alnum>[A-Z0-9]{4,8})\b
+    | \b(?P<num>\d{4,8})\b
+    """
+)
+
+
+def _next_poll_delay(last_delay: float, got_new: bool) -> float:
+    base = _POLL_DELAY_MIN if got_new else min(last_delay * 2, _POLL_DELAY_MAX)
+    return base * random.uniform(0.8, 1.2)
+
 
 class TempMailGenerator:
     """
@@ -16,71 +88,109 @@ class TempMailGenerator:
     
     def __init__(self):
         self.base_url = "https://www.1secmail.com/api/v1/"
+        # Pooled session: keep-alive avoids a fresh TCP/TLS handshake per
+        # poll, and the adapter retries transient 403/429/5xx with backoff
+        # so callers no longer need hand-rolled retry loops.
+        self._session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=1.5,
+            # 403 is deliberately absent: a block is not transient, so
+            # retrying it with the same User-Agent only burns backoff
+            # time. _get_json rotates the UA on 403 instead, and
+            # get_inbox falls over to mail.tm.
+            status_forcelist=(429, 500, 502, 503, 504),
+            # Hand back the final response instead of raising RetryError,
+            # so _get_json sees the real status code and the 403 handling
+            # (provider failover, UA rotation) stays reachable.
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._ua_cycle = itertools.cycle(_USER_AGENTS)
+        self._default_headers = {
+            "Accept": "application/json, text/plain, */*",
+            "User-Agent": next(self._ua_cycle),
+            "Cache-Control": "no-cache",
+            "Pragma": "no-cache",
+        }
         self.email = None
         self.login = None
         self.domain = None
         self.last_http_status = None
         self.last_http_error = None
+        # Returned directly by get_inbox — callers must not mutate it
         self._last_inbox: List[Dict] = []
         self._last_inbox_ts: float = 0.0
+        self._inbox_etag: Optional[str] = None
         self._min_fetch_interval_sec: float = 6.0
         # Provider handling
         self.provider = "1secmail"  # or "mailtm"
+        # Domain lists change rarely; cache per provider for 10 minutes
+        self._domains_cache: Dict[str, Tuple[float, List[str]]] = {}
+        # Received messages never change, so completed reads are kept in a
+        # small LRU keyed by (provider, email_id); no invalidation needed
+        self._msg_cache: "OrderedDict[Tuple[str, object], Dict]" = OrderedDict()
+        # Message ids already seen by the polling loops / already exported;
+        # id-set membership is correct even when a delete and an arrival
+        # leave the inbox length unchanged
+        self._seen_ids: set = set()
+        self._exported_ids: set = set()
         self.mailtm_token = None
         self.mailtm_address = None
         self.mailtm_account_id = None
         
-    def _get_json(self, url: str) -> Optional[Dict]:
-        """Fetch URL and return parsed JSON or None on failure."""
+    def _get_json(self, url: str, etag: Optional[str] = None):
+        """Fetch URL and return parsed JSON or None on failure.
+
+        When etag is given it is sent as If-None-Match; a 304 answer
+        returns the _NOT_MODIFIED sentinel and the caller serves its
+        cache. The response ETag, if any, lands in self.last_etag.
+        """
         self.last_http_status = None
         self.last_http_error = None
-        # Rotate a couple of common User-Agents to reduce 403s
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
-            "Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/126.0",
-        ]
-        headers = {
-            "Accept": "application/json, text/plain, */*",
-            "User-Agent": random.choice(user_agents),
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache",
-        }
-        # Simple retry with backoff to handle transient 403/5xx
-        for attempt in range(3):
+        self.last_etag = None
+        headers = self._default_headers
+        if etag:
+            headers = {**headers, "If-None-Match": etag}
+        try:
+            resp = self._session.get(url, headers=headers, timeout=15)
+            self.last_http_status = resp.status_code
+            if etag and resp.status_code == 304:
+                return _NOT_MODIFIED
+            resp.raise_for_status()
+            self.last_etag = resp.headers.get("ETag")
             try:
-                resp = requests.get(url, headers=headers, timeout=15)
-                self.last_http_status = resp.status_code
-                if resp.status_code == 403:
-                    # Provider may block rapid polling; backoff and retry
-                    time.sleep(1.5 * (attempt + 1))
-                    resp.raise_for_status()
-                resp.raise_for_status()
-                try:
-                    return resp.json()
-                except Exception:
-                    preview = (resp.text or "").strip()[:120]
-                    print(f"❌ Non-JSON response from provider: {preview}")
-                    return None
-            except requests.HTTPError as e:
-                self.last_http_error = str(e)
-                if getattr(e, "response", None) is not None:
-                    self.last_http_status = e.response.status_code
-                # Backoff and retry on 403/429/5xx
-                if self.last_http_status in (403, 429, 500, 502, 503, 504) and attempt < 2:
-                    time.sleep(1.5 * (attempt + 1))
-                    continue
-                print(f"❌ HTTP error: {e}")
-                return None
-            except Exception as e:
-                self.last_http_error = str(e)
-                print(f"❌ HTTP error: {e}")
+                return resp.json()
+            except Exception:
+                preview = (resp.text or "").strip()[:120]
+                logger.warning("Non-JSON response from provider: %s", preview)
                 return None
+        except requests.HTTPError as e:
+            self.last_http_error = str(e)
+            if getattr(e, "response", None) is not None:
+                self.last_http_status = e.response.status_code
+            if self.last_http_status == 403:
+                # Blocked; present a different UA on the next call
+                self._default_headers["User-Agent"] = next(self._ua_cycle)
+            logger.warning("HTTP error: %s", e)
+            return None
+        except Exception as e:
+            self.last_http_error = str(e)
+            logger.warning("HTTP error: %s", e)
+            return None
+
+    def __del__(self):
+        try:
+            self._session.close()
+        except Exception:
+            pass
 
     def _sanitize_filename(self, name: str) -> str:
-        safe = re.sub(r"[\\/:*?\"<>|]", "_", name)
-        safe = re.sub(r"\s+", " ", safe).strip()
-        return safe or "email"
+        safe = name.translate(_SANITIZE_TABLE)
+        # split() with no argument collapses any whitespace runs
+        return " ".join(safe.split()) or "email"
 
     def _ensure_output_dir(self, output_dir: str) -> str:
         if not output_dir:
@@ -88,20 +198,30 @@ class TempMailGenerator:
         os.makedirs(output_dir, exist_ok=True)
         return output_dir
 
+    _DOMAINS_TTL_SEC = 600.0
+
     def get_available_domains(self) -> List[str]:
         """Get list of available domains"""
+        ts, cached = self._domains_cache.get(self.provider, (0.0, None))
+        if cached and time.time() - ts < self._DOMAINS_TTL_SEC:
+            return cached
+
         if self.provider == "1secmail":
             data = self._get_json(f"{self.base_url}?action=getDomainList")
             if isinstance(data, list):
+                self._domains_cache[self.provider] = (time.time(), data)
                 return data
             return []
         # mail.tm
         try:
-            resp = requests.get("https://api.mail.tm/domains", timeout=15)
+            resp = self._session.get("https://api.mail.tm/domains", timeout=15)
             resp.raise_for_status()
             js = resp.json()
             items = js.get("hydra:member") or []
-            return [it.get("domain") for it in items if it.get("domain")]
+            domains = [it.get("domain") for it in items if it.get("domain")]
+            if domains:
+                self._domains_cache[self.provider] = (time.time(), domains)
+            return domains
         except Exception:
             return []
     
@@ -113,7 +233,7 @@ class TempMailGenerator:
             if not domains or self.last_http_status == 403:
                 self.provider = "mailtm"
             else:
-                username = ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
+                username = ''.join(secrets.choice(_ALPHABET) for _ in range(length))
                 domain = random.choice(domains)
                 self.login = username
                 self.domain = domain
@@ -138,22 +258,28 @@ class TempMailGenerator:
     def get_inbox(self) -> List[Dict]:
         """Get all emails from inbox"""
         if not self.login or not self.domain:
-            print("❌ Please generate an email first!")
+            logger.warning("No email generated yet; nothing to fetch")
             return []
         
         # Rate limit provider polling
         now = time.time()
         if now - self._last_inbox_ts < self._min_fetch_interval_sec:
-            return list(self._last_inbox)
+            return self._last_inbox
 
         if self.provider == "1secmail":
             data = self._get_json(
-                f"{self.base_url}?action=getMessages&login={self.login}&domain={self.domain}"
+                f"{self.base_url}?action=getMessages&login={self.login}&domain={self.domain}",
+                etag=self._inbox_etag,
             )
+            if data is _NOT_MODIFIED:
+                # Inbox unchanged; the 304 carried no body to parse
+                self._last_inbox_ts = now
+                return self._last_inbox
+            self._inbox_etag = self.last_etag
             if isinstance(data, list):
                 self._last_inbox = data
                 self._last_inbox_ts = now
-                return list(self._last_inbox)
+                return self._last_inbox
             # If 1secmail is blocking, auto-switch to mail.tm and try once
             if self.last_http_status == 403:
                 self.provider = "mailtm"
@@ -165,10 +291,16 @@ class TempMailGenerator:
             try:
                 if not self.mailtm_token:
                     self._mailtm_ensure_token()
-                headers = {"Authorization": f"Bearer {self.mailtm_token}"}
-                resp = requests.get("https://api.mail.tm/messages", headers=headers, timeout=15)
+                headers = self._mailtm_headers()
+                if self._inbox_etag:
+                    headers["If-None-Match"] = self._inbox_etag
+                resp = self._session.get("https://api.mail.tm/messages", headers=headers, timeout=15)
                 self.last_http_status = resp.status_code
+                if resp.status_code == 304:
+                    self._last_inbox_ts = now
+                    return self._last_inbox
                 resp.raise_for_status()
+                self._inbox_etag = resp.headers.get("ETag")
                 js = resp.json()
                 items = js.get("hydra:member") or []
                 normalized = []
@@ -177,81 +309,190 @@ class TempMailGenerator:
                         'id': it.get('id'),
                         'from': (it.get('from') or {}).get('address'),
                         'subject': it.get('subject'),
-                        'date': it.get('receivedAt')
+                        'date': it.get('receivedAt'),
+                        'intro': it.get('intro')
                     })
                 self._last_inbox = normalized
                 self._last_inbox_ts = now
-                return list(self._last_inbox)
+                return self._last_inbox
             except Exception as e:
                 self.last_http_error = str(e)
+                if self.last_http_status == 401:
+                    self._mailtm_invalidate()
         if self.last_http_status == 403:
-            print("❌ Error fetching inbox: Access forbidden (403). Try waiting a moment or generating a new email.")
+            logger.warning("Error fetching inbox: access forbidden (403); wait a moment or generate a new email")
         else:
-            print("❌ Error fetching inbox: Provider returned no JSON list")
+            logger.warning("Error fetching inbox: provider returned no JSON list")
         # On error, return last cached inbox if available
-        return list(self._last_inbox)
+        return self._last_inbox
     
+    _MSG_CACHE_MAX = 128
+
+    def _msg_cache_put(self, key: Tuple[str, object], data: Dict) -> Dict:
+        self._msg_cache[key] = data
+        if len(self._msg_cache) > self._MSG_CACHE_MAX:
+            self._msg_cache.popitem(last=False)
+        return data
+
     def read_email(self, email_id: int) -> Dict:
         """Read specific email by ID"""
         if not self.login or not self.domain:
-            print("❌ Please generate an email first!")
+            logger.warning("No email generated yet; nothing to read")
             return {}
         
+        key = (self.provider, email_id)
+        cached = self._msg_cache.get(key)
+        if cached is not None:
+            self._msg_cache.move_to_end(key)
+            return cached
+        
         if self.provider == "1secmail":
             data = self._get_json(
                 f"{self.base_url}?action=readMessage&login={self.login}&domain={self.domain}&id={email_id}"
             )
             if isinstance(data, dict):
-                return data
+                return self._msg_cache_put(key, data)
         else:
             try:
                 if not self.mailtm_token:
                     self._mailtm_ensure_token()
-                headers = {"Authorization": f"Bearer {self.mailtm_token}"}
-                resp = requests.get(f"https://api.mail.tm/messages/{email_id}", headers=headers, timeout=15)
+                resp = self._session.get(
+                    f"https://api.mail.tm/messages/{email_id}",
+                    headers=self._mailtm_headers(), timeout=15, stream=True,
+                )
                 self.last_http_status = resp.status_code
                 resp.raise_for_status()
+                if int(resp.headers.get('content-length') or 0) > MAX_INLINE_BODY:
+                    # Oversized payload: spool the raw envelope to disk,
+                    # parse it once to pull out the plain-text part, and
+                    # discard the rest — the bulk is html alternatives and
+                    # attachment data that must stay out of the cache and
+                    # the export files.
+                    with tempfile.NamedTemporaryFile(
+                        mode='wb', suffix='.json', prefix='tempmail_', delete=False
+                    ) as spool:
+                        for chunk in resp.iter_content(chunk_size=65536):
+                            spool.write(chunk)
+                        spool_path = spool.name
+                    try:
+                        with open(spool_path, encoding='utf-8', errors='replace') as src:
+                            it = json.load(src)
+                    except Exception:
+                        it = {}
+                    body = it.get('text') or it.get('intro') or ''
+                    record = {
+                        'id': it.get('id') or email_id,
+                        'from': (it.get('from') or {}).get('address'),
+                        'subject': it.get('subject'),
+                        'date': it.get('receivedAt'),
+                        'textBody': body,
+                        'body': body,
+                    }
+                    if len(body) > MAX_INLINE_BODY:
+                        # Even the text part alone is oversized: leave it
+                        # on disk for save_email_to_file to stream (which
+                        # unlinks the spool after copying) and inline only
+                        # a preview for display/code extraction. Not
+                        # cached, since the spool is single-use.
+                        with open(spool_path, 'w', encoding='utf-8') as dst:
+                            dst.write(body)
+                        record['textBody'] = record['body'] = body[:65536]
+                        record['bodyFile'] = spool_path
+                        return record
+                    os.unlink(spool_path)
+                    return self._msg_cache_put(key, record)
                 it = resp.json()
                 body = it.get('text') or it.get('intro') or ''
-                return {
+                return self._msg_cache_put(key, {
                     'id': it.get('id'),
                     'from': (it.get('from') or {}).get('address'),
                     'subject': it.get('subject'),
                     'date': it.get('receivedAt'),
                     'textBody': body,
                     'body': body,
-                }
+                })
             except Exception as e:
                 self.last_http_error = str(e)
-        print("❌ Error reading email: Provider returned no JSON object")
+                if self.last_http_status == 401:
+                    self._mailtm_invalidate()
+        logger.warning("Error reading email: provider returned no JSON object")
         return {}
 
     # ---------- mail.tm helpers ----------
+    def _mailtm_load_creds(self) -> bool:
+        """Adopt persisted mail.tm credentials if still fresh."""
+        try:
+            with open(_MAILTM_CREDS_PATH, encoding='utf-8') as f:
+                creds = json.load(f)
+            if time.time() >= creds.get('token_expiry', 0) - 60:
+                return False
+            self.mailtm_token = creds['token']
+            self.mailtm_address = creds['address']
+            self.mailtm_account_id = creds.get('account_id')
+            self.email = self.mailtm_address
+            self.login, _, self.domain = self.mailtm_address.partition('@')
+            self.provider = "mailtm"
+            return True
+        except Exception:
+            return False
+
+    def _mailtm_save_creds(self, password: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(_MAILTM_CREDS_PATH), exist_ok=True)
+            with open(_MAILTM_CREDS_PATH, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'address': self.mailtm_address,
+                    'password': password,
+                    'token': self.mailtm_token,
+                    'account_id': self.mailtm_account_id,
+                    'token_expiry': time.time() + _MAILTM_TOKEN_TTL_SEC,
+                }, f)
+        except Exception:
+            pass
+
+    def _mailtm_invalidate(self) -> None:
+        """Drop the cached token, e.g. after a 401 from mail.tm."""
+        self.mailtm_token = None
+        try:
+            os.remove(_MAILTM_CREDS_PATH)
+        except OSError:
+            pass
+
+    def _mailtm_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.mailtm_token}", "Accept": "application/json"}
+
+    def _mailtm_ensure_token(self) -> None:
+        """Ensure a mail.tm token exists, reusing persisted credentials."""
+        if self.mailtm_token:
+            return
+        if self._mailtm_load_creds():
+            return
+        self._mailtm_create_account()
+
     def _mailtm_create_account(self, custom_local: Optional[str] = None, domain: Optional[str] = None) -> str:
+        # Reuse a persisted account unless a specific address was asked for
+        if not custom_local and not domain and self._mailtm_load_creds():
+            return self.email
         try:
-            # Get domain list
-            doms = []
-            try:
-                resp = requests.get("https://api.mail.tm/domains", timeout=15)
-                resp.raise_for_status()
-                js = resp.json()
-                doms = [it.get('domain') for it in (js.get('hydra:member') or []) if it.get('domain')]
-            except Exception:
-                pass
+            # Domain list via the TTL-cached helper instead of a duplicate
+            # inline fetch; flip the provider first so it asks mail.tm
+            self.provider = "mailtm"
+            doms = self.get_available_domains()
             use_domain = domain or (doms[0] if doms else None)
 
-            local = custom_local or ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
+            local = custom_local or ''.join(secrets.choice(_ALPHABET) for _ in range(10))
             address = f"{local}@{use_domain}" if use_domain else None
-            password = ''.join(random.choices(string.ascii_letters + string.digits, k=16))
+            # Account password must be cryptographically random
+            password = secrets.token_urlsafe(12)
 
             # Create account
             create_payload = {"address": address, "password": password}
-            resp = requests.post("https://api.mail.tm/accounts", json=create_payload, timeout=20)
+            resp = self._session.post("https://api.mail.tm/accounts", json=create_payload, timeout=20)
             resp.raise_for_status()
             acc = resp.json()
 
             # Login to get token
-            token_resp = requests.post("https://api.mail.tm/token", json={"address": acc.get("address"), "password": password}, timeout=20)
+            token_resp = self._session.post("https://api.mail.tm/token", json={"address": acc.get("address"), "password": password}, timeout=20)
             token_resp.raise_for_status()
             tok = token_resp.json()
 
@@ -262,17 +503,17 @@ class TempMailGenerator:
             self.login = self.mailtm_address.split('@')[0] if self.mailtm_address else None
             self.domain = self.mailtm_address.split('@')[1] if self.mailtm_address and '@' in self.mailtm_address else None
             self.provider = "mailtm"
+            self._mailtm_save_creds(password)
             return self.email
         except Exception as e:
-            print(f"❌ mail.tm error: {e}")
+            logger.warning("mail.tm error: %s", e)
             # fall back to 1secmail
             self.provider = "1secmail"
             return self._fallback_1secmail_random()
 
     def _fallback_1secmail_random(self) -> str:
-        domains = ["1secmail.com", "1secmail.org", "1secmail.net"]
-        username = ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
-        domain = random.choice(domains)
+        username = ''.join(secrets.choice(_ALPHABET) for _ in range(10))
+        domain = random.choice(_FALLBACK_1SECMAIL_DOMAINS)
         self.login = username
         self.domain = domain
         self.email = f"{username}@{domain}"
@@ -280,42 +521,32 @@ class TempMailGenerator:
     
     def extract_codes(self, text: str) -> List[str]:
         """Extract verification codes/OTPs from email text"""
-        patterns = [
-            r'\b\d{4,8}\b',  # 4-8 digit codes
-            r'\b[A-Z0-9]{4,8}\b',  # Alphanumeric codes
-            r'code[:\s]+([A-Z0-9]{4,8})',  # "code: XXXX"
-            r'OTP[:\s]+(\d{4,8})',  # "OTP: 1234"
-            r'verification code[:\s]+([A-Z0-9]{4,8})',
-            r'pin[:\s]+(\d{4,6})',  # PIN codes
-        ]
-        
-        codes = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            codes.extend(matches)
-        
-        # Remove duplicates and return unique codes
-        return list(set(codes))
+        # Single pass over the text; the set dedupes during iteration
+        return list({m.group(m.lastgroup) for m in _CODE_RE.finditer(text)})
     
     def wait_for_email(self, timeout: int = 60, check_interval: int = 5) -> Optional[Dict]:
         """Wait for new email with timeout"""
-        print(f"⏳ Waiting for email (timeout: {timeout}s)...")
+        logger.info("Waiting for email (timeout: %ss)...", timeout)
         
         start_time = time.time()
-        last_count = 0
+        delay = float(check_interval)
         
         while time.time() - start_time < timeout:
             inbox = self.get_inbox()
             
-            if len(inbox) > last_count:
-                print(f"📧 New email received!")
-                return inbox[0]  # Return latest email
+            new_emails = [m for m in inbox if m.get('id') not in self._seen_ids]
+            self._seen_ids.update(m.get('id') for m in inbox)
+            if new_emails:
+                logger.info("New email received!")
+                return new_emails[0]  # Return latest email
             
-            last_count = len(inbox)
-            time.sleep(check_interval)
-            print(".", end="", flush=True)
+            time.sleep(delay)
+            delay = _next_poll_delay(delay, got_new=False)
+            if _IS_TTY:
+                sys.stdout.write(f"\r⏳ {int(time.time() - start_time)}s elapsed...")
+                sys.stdout.flush()
         
-        print("\n⏰ Timeout! No email received.")
+        logger.info("Timeout! No email received.")
         return None
     
     def display_email(self, email_data: Dict):
@@ -338,18 +569,24 @@ class TempMailGenerator:
         
         print("="*60 + "\n")
 
-    def save_email_to_file(self, email_data: Dict, output_dir: str = "inbox") -> str:
-        """Save a single email to a text file and return the file path."""
-        output_dir = self._ensure_output_dir(output_dir)
+    def save_email_to_file(self, email_data: Dict, output_dir: str = "inbox", summary_file=None, ts: Optional[str] = None) -> str:
+        """Save a single email to a text file and return the file path.
+
+        When summary_file is given (batch export), the caller has already
+        created output_dir and holds the summary log open, so this writes
+        one file instead of re-opening two per email. ts lets a batch pass
+        one shared timestamp so filenames stay monotonic within an export.
+        """
+        if summary_file is None:
+            output_dir = self._ensure_output_dir(output_dir)
 
         email_from = email_data.get('from', 'Unknown')
         subject = email_data.get('subject', 'No Subject')
         date_str = email_data.get('date') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         body = email_data.get('textBody') or email_data.get('body', '')
 
-        # Build filename
-        # Normalize date for filename
-        date_for_filename = re.sub(r"[^0-9]", "", datetime.now().strftime('%Y%m%d%H%M%S'))
+        # Build filename; %Y%m%d%H%M%S is already digits-only
+        date_for_filename = ts or datetime.now().strftime('%Y%m%d%H%M%S')
         email_id_part = str(email_data.get('id') or "")
         subject_part = self._sanitize_filename(subject)[:60]
         filename = f"{date_for_filename}_{email_id_part}_{subject_part}.txt" if email_id_part else f"{date_for_filename}_{subject_part}.txt"
@@ -361,17 +598,33 @@ class TempMailGenerator:
             f"Date: {date_str}",
             "",
             "Message:",
-            body or "(no body)",
-            "",
         ]
 
+        body_file = email_data.get('bodyFile')
         with open(file_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(content_lines))
+            f.write("\n".join(content_lines) + "\n")
+            if body_file:
+                # Oversized message spooled to disk by read_email; stream it
+                # across without loading it into memory
+                with open(body_file, 'r', encoding='utf-8', errors='replace') as src_f:
+                    shutil.copyfileobj(src_f, f)
+                f.write("\n")
+                # Single-use spool from read_email; remove it once copied
+                try:
+                    os.unlink(body_file)
+                except OSError:
+                    pass
+            else:
+                f.write((body or "(no body)") + "\n")
 
         # Append to summary log
-        summary_path = os.path.join(output_dir, "inbox_summary.txt")
-        with open(summary_path, 'a', encoding='utf-8') as f:
-            f.write(f"{filename}\t{date_str}\t{email_from}\t{subject}\n")
+        summary_line = f"{filename}\t{date_str}\t{email_from}\t{subject}\n"
+        if summary_file is not None:
+            summary_file.write(summary_line)
+        else:
+            summary_path = os.path.join(output_dir, "inbox_summary.txt")
+            with open(summary_path, 'a', encoding='utf-8') as f:
+                f.write(summary_line)
 
         return file_path
 
@@ -383,15 +636,130 @@ class TempMailGenerator:
             return exported_files
 
         output_dir = self._ensure_output_dir(output_dir)
-        for item in inbox:
-            try:
-                email_id = item.get('id')
-                email_data = self.read_email(email_id) if email_id is not None else item
-                path = self.save_email_to_file(email_data, output_dir)
-                exported_files.append(path)
-            except Exception as e:
-                # Skip problematic email but continue others
-                print(f"❌ Failed to save email {item.get('id')}: {e}")
+        summary_path = os.path.join(output_dir, "inbox_summary.txt")
+        batch_ts = datetime.now().strftime('%Y%m%d%H%M%S')
+        with open(summary_path, 'a', encoding='utf-8', buffering=8192) as summary_f:
+            for item in inbox:
+                try:
+                    email_id = item.get('id')
+                    if email_id is not None and email_id in self._exported_ids:
+                        continue
+                    # mail.tm's listing already carries the intro text; use
+                    # it as the body and skip the per-message GET
+                    if self.provider == "mailtm" and item.get('intro'):
+                        email_data = {**item, 'textBody': item['intro'], 'body': item['intro']}
+                    elif email_id is not None:
+                        email_data = self.read_email(email_id)
+                    else:
+                        email_data = item
+                    path = self.save_email_to_file(email_data, output_dir, summary_file=summary_f, ts=batch_ts)
+                    exported_files.append(path)
+                    if email_id is not None:
+                        self._exported_ids.add(email_id)
+                except Exception as e:
+                    # Skip problematic email but continue others
+                    logger.warning("Failed to save email %s: %s", item.get('id'), e)
+        return exported_files
+
+    # ---------- async variants (aiohttp) ----------
+    async def _aget_json(self, session, url: str, headers: Optional[Dict] = None) -> Optional[Dict]:
+        """Async counterpart of _get_json using a shared aiohttp session."""
+        self.last_http_status = None
+        self.last_http_error = None
+        try:
+            async with session.get(url, headers=headers) as resp:
+                self.last_http_status = resp.status
+                resp.raise_for_status()
+                return await resp.json(content_type=None)
+        except Exception as e:
+            self.last_http_error = str(e)
+            return None
+
+    async def aget_inbox(self, session) -> List[Dict]:
+        """Fetch the inbox list over the given aiohttp session."""
+        if not self.login or not self.domain:
+            return []
+        if self.provider == "1secmail":
+            data = await self._aget_json(
+                session,
+                f"{self.base_url}?action=getMessages&login={self.login}&domain={self.domain}",
+            )
+            return data if isinstance(data, list) else []
+        data = await self._aget_json(
+            session, "https://api.mail.tm/messages", headers=self._mailtm_headers()
+        )
+        items = (data or {}).get('hydra:member') or []
+        return [
+            {
+                'id': it.get('id'),
+                'from': (it.get('from') or {}).get('address'),
+                'subject': it.get('subject'),
+                'date': it.get('receivedAt'),
+                'intro': it.get('intro'),
+            }
+            for it in items
+        ]
+
+    async def aread_email(self, session, email_id) -> Dict:
+        """Fetch one message body over the given aiohttp session."""
+        if self.provider == "1secmail":
+            data = await self._aget_json(
+                session,
+                f"{self.base_url}?action=readMessage&login={self.login}&domain={self.domain}&id={email_id}",
+            )
+            return data if isinstance(data, dict) else {}
+        it = await self._aget_json(
+            session, f"https://api.mail.tm/messages/{email_id}", headers=self._mailtm_headers()
+        )
+        if not isinstance(it, dict):
+            return {}
+        body = it.get('text') or it.get('intro') or ''
+        return {
+            'id': it.get('id'),
+            'from': (it.get('from') or {}).get('address'),
+            'subject': it.get('subject'),
+            'date': it.get('receivedAt'),
+            'textBody': body,
+            'body': body,
+        }
+
+    async def aexport_inbox(self, output_dir: str = "inbox") -> List[str]:
+        """Export the inbox with message bodies fetched concurrently.
+
+        Uses native aiohttp sockets so the event loop yields during the
+        network waits; for N messages the bodies arrive in ~1 RTT instead
+        of N sequential round-trips.
+        """
+        import aiohttp  # optional dependency, only needed for the async path
+
+        output_dir = self._ensure_output_dir(output_dir)
+        connector = aiohttp.TCPConnector(limit=8)
+        timeout = aiohttp.ClientTimeout(total=15)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            inbox = await self.aget_inbox(session)
+            inbox = [m for m in inbox if m.get('id') not in self._exported_ids]
+            if not inbox:
+                return []
+            async def _abody(item: Dict) -> Dict:
+                # Same intro fast path as the sync export
+                if self.provider == "mailtm" and item.get('intro'):
+                    return {**item, 'textBody': item['intro'], 'body': item['intro']}
+                return await self.aread_email(session, item.get('id'))
+
+            bodies = await asyncio.gather(*(_abody(item) for item in inbox))
+        exported_files: List[str] = []
+        summary_path = os.path.join(output_dir, "inbox_summary.txt")
+        batch_ts = datetime.now().strftime('%Y%m%d%H%M%S')
+        with open(summary_path, 'a', encoding='utf-8', buffering=8192) as summary_f:
+            for item, email_data in zip(inbox, bodies):
+                try:
+                    exported_files.append(
+                        self.save_email_to_file(email_data or item, output_dir, summary_file=summary_f, ts=batch_ts)
+                    )
+                    if item.get('id') is not None:
+                        self._exported_ids.add(item.get('id'))
+                except Exception as e:
+                    logger.warning("Failed to save email %s: %s", item.get('id'), e)
         return exported_files
 
 
@@ -399,7 +767,21 @@ class TempMailCLI:
     """Command Line Interface for Temp Mail"""
     
     def __init__(self):
+        # Interactive use: surface the library's info-level messages
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
         self.mail = TempMailGenerator()
+        # Menu dispatch table; '9' (exit) is handled in run's loop
+        self._actions = {
+            '1': self.generate_random,
+            '2': self.generate_custom,
+            '3': self.check_inbox,
+            '4': self.wait_for_email,
+            '5': self.read_specific_email,
+            '6': self.extract_codes_from_last,
+            '7': self.show_domains,
+            '8': self.auto_monitor,
+            '10': self.export_inbox_to_files,
+        }
     
     def run(self):
         """Run the CLI application"""
@@ -422,27 +804,12 @@ class TempMailCLI:
             
             choice = input("\n👉 Enter your choice: ").strip()
             
-            if choice == '1':
-                self.generate_random()
-            elif choice == '2':
-                self.generate_custom()
-            elif choice == '3':
-                self.check_inbox()
-            elif choice == '4':
-                self.wait_for_email()
-            elif choice == '5':
-                self.read_specific_email()
-            elif choice == '6':
-                self.extract_codes_from_last()
-            elif choice == '7':
-                self.show_domains()
-            elif choice == '8':
-                self.auto_monitor()
-            elif choice == '9':
+            if choice == '9':
                 print("\n👋 Bye! Thanks for using Temp Mail Generator!")
                 break
-            elif choice == '10':
-                self.export_inbox_to_files()
+            action = self._actions.get(choice)
+            if action:
+                action()
             else:
                 print("❌ Invalid choice! Please try again.")
     
@@ -464,6 +831,14 @@ class TempMailCLI:
         email = self.mail.generate_custom_email(username, domain)
         print(f"\n✅ Generated Email: {email}")
     
+    def _print_inbox(self, inbox):
+        print(f"\n✉️  You have {len(inbox)} email(s):\n")
+        for i, email in enumerate(inbox, 1):
+            print(f"{i}. From: {email.get('from')}")
+            print(f"   Subject: {email.get('subject')}")
+            print(f"   Date: {email.get('date')}")
+            print()
+
     def check_inbox(self):
         if not self.mail.email:
             print("❌ Please generate an email first!")
@@ -476,12 +851,7 @@ class TempMailCLI:
             print("📭 No emails yet!")
             return
         
-        print(f"\n✉️  You have {len(inbox)} email(s):\n")
-        for i, email in enumerate(inbox, 1):
-            print(f"{i}. From: {email.get('from')}")
-            print(f"   Subject: {email.get('subject')}")
-            print(f"   Date: {email.get('date')}")
-            print()
+        self._print_inbox(inbox)
     
     def wait_for_email(self):
         timeout = int(input("Enter timeout in seconds (default 60): ").strip() or "60")
@@ -497,7 +867,7 @@ class TempMailCLI:
             print("📭 No emails in inbox!")
             return
         
-        self.check_inbox()
+        self._print_inbox(inbox)
         email_num = int(input("Enter email number to read: ").strip())
         
         if 1 <= email_num <= len(inbox):
@@ -535,21 +905,22 @@ class TempMailCLI:
         print("📧 Current email:", self.mail.email)
         print("Press Ctrl+C to stop\n")
         
-        last_count = 0
+        seen = self.mail._seen_ids
+        delay = _POLL_DELAY_MIN
         try:
             while True:
                 inbox = self.mail.get_inbox()
                 
-                if len(inbox) > last_count:
+                new_emails = [m for m in inbox if m.get('id') not in seen]
+                seen.update(m.get('id') for m in inbox)
+                if new_emails:
                     print("\n🔔 New email detected!")
-                    new_emails = inbox[:len(inbox) - last_count]
-                    
                     for email in new_emails:
                         email_data = self.mail.read_email(email['id'])
                         self.mail.display_email(email_data)
                 
-                last_count = len(inbox)
-                time.sleep(5)
+                time.sleep(delay)
+                delay = _next_poll_delay(delay, bool(new_emails))
                 
         except KeyboardInterrupt:
             print("\n\n⏹️  Monitoring stopped!")